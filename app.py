@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, timezone
 from random import uniform
 from flask import Flask, jsonify, request
 import feedparser
+from models import Klines, Position, ClosedTrade, AlertPayload, json_default
 
 # ==========================
 #  CONFIGURACIÓN GLOBAL
@@ -52,18 +53,37 @@ BINANCE_ENDPOINTS = [
 BINANCE = BINANCE_ENDPOINTS[0]
 HEADERS = {"User-Agent": "Mozilla/5.0 (CriptoAI Bot)"}
 
+# ==========================
+#  RELOJ (inyectable)
+# ==========================
+class SystemClock:
+    """Reloj real. Todo el agente pide la hora y duerme a través de CLOCK,
+    de modo que el simulador (simulate.py) puede sustituirlo por uno virtual."""
+    def now(self, tz=None):
+        return datetime.now(tz)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+CLOCK = SystemClock()
+
+def set_clock(clock):
+    """Sustituye el reloj global (p. ej. por un VirtualClock en simulación)."""
+    global CLOCK
+    CLOCK = clock
+
 # ==========================
 #  UTILIDADES BÁSICAS
 # ==========================
 def nowiso():
     if MADRID_TZ:
-        return datetime.now(MADRID_TZ).isoformat(timespec="seconds")
-    return (datetime.utcnow() + timedelta(hours=2)).isoformat(timespec="seconds")
+        return CLOCK.now(MADRID_TZ).isoformat(timespec="seconds")
+    return (CLOCK.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=2)).isoformat(timespec="seconds")
 
 def now_local():
     if MADRID_TZ:
-        return datetime.now(MADRID_TZ)
-    return datetime.now(timezone.utc)
+        return CLOCK.now(MADRID_TZ)
+    return CLOCK.now(timezone.utc)
 
 def sym_to_pair(sym: str) -> str:
     return sym.replace("USDT", "") + "/USD"
@@ -79,10 +99,24 @@ def safe_save_json(path, data):
     try:
         os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
     except Exception as e:
         print("save error", path, e)
 
+def load_state(path, default):
+    """state.json → {sym: {"trades": [Position]}}."""
+    st = safe_load_json(path, default)
+    for v in st.values():
+        if isinstance(v, dict) and "trades" in v:
+            v["trades"] = [t if isinstance(t, Position) else Position.from_json(t) for t in v["trades"]]
+    return st
+
+def load_performance(path, default):
+    """performance.json → {"wins", "losses", "trades": [ClosedTrade]}."""
+    perf = safe_load_json(path, default)
+    perf["trades"] = [t if isinstance(t, ClosedTrade) else ClosedTrade.from_json(t) for t in perf.get("trades", [])]
+    return perf
+
 # ==========================
 #  ARCHIVOS LOCALES /tmp
 # ==========================
@@ -109,8 +143,8 @@ def ensure_local_files():
 #  CARGA ESTADO / PARAMS / CACHE
 # ==========================
 ensure_local_files()
-state = safe_load_json(STATE_PATH, {s: {"trades": []} for s in SYMBOLS})
-performance = safe_load_json(PERF_PATH, {"wins": 0, "losses": 0, "trades": []})
+state = load_state(STATE_PATH, {s: {"trades": []} for s in SYMBOLS})
+performance = load_performance(PERF_PATH, {"wins": 0, "losses": 0, "trades": []})
 params = safe_load_json(PARAMS_PATH, {
     "SMA_FAST": 10, "SMA_SLOW": 60, "ATR_LEN": 14,
     "VOL_LEN": 24, "PULLBACK_ATR": 0.15,
@@ -127,7 +161,7 @@ def get_cached(key, max_age_sec: int):
         ts = datetime.fromisoformat(e["ts"])
     except:
         return None
-    now = datetime.now(ts.tzinfo) if ts.tzinfo else datetime.now()
+    now = CLOCK.now(ts.tzinfo) if ts.tzinfo else CLOCK.now()
     if (now - ts).total_seconds() > max_age_sec:
         return None
     return e["data"]
@@ -144,8 +178,8 @@ def auto_tune():
     trades = performance.get("trades", [])
     if len(trades) < 30: return
     recent = trades[-30:]
-    wins = sum(1 for t in recent if t.get("result") == "TP")
-    losses = sum(1 for t in recent if t.get("result") == "SL")
+    wins = sum(1 for t in recent if t.result == "TP")
+    losses = sum(1 for t in recent if t.result == "SL")
     total = wins + losses
     if total == 0: return
     winrate = wins / total
@@ -168,7 +202,7 @@ def http_get(url, params_=None, timeout=12):
         try:
             r = requests.get(url, params=params_, headers=HEADERS, timeout=timeout)
             if r.status_code == 429:
-                time.sleep(2 + tries * 2); tries += 1; continue
+                CLOCK.sleep(2 + tries * 2); tries += 1; continue
             if r.status_code == 451:
                 if endpoint_idx + 1 < len(BINANCE_ENDPOINTS):
                     old = BINANCE_ENDPOINTS[endpoint_idx]
@@ -180,20 +214,20 @@ def http_get(url, params_=None, timeout=12):
             return r.json()
         except Exception as e:
             if tries < 2:
-                time.sleep(2); tries += 1; continue
+                CLOCK.sleep(2); tries += 1; continue
             print("❌ HTTP error:", e); return None
 
 def get_klines(symbol, interval="1h", limit=200):
     key = f"k_{symbol}_{interval}_{limit}"
     cached = get_cached(key, max_age_sec=55)
-    if cached: return cached
+    if cached:
+        if not isinstance(cached, Klines):  # recién leído de cache.json
+            cached = Klines.from_json(cached); cache[key]["data"] = cached
+        return cached
     url = f"{BINANCE}/api/v3/klines"
     data = http_get(url, {"symbol": symbol, "interval": interval, "limit": limit})
-    if not data: return []
-    out = []
-    for k in data:
-        out.append({"t": int(k[0]), "o": float(k[1]), "h": float(k[2]),
-                    "l": float(k[3]), "c": float(k[4]), "v": float(k[5])})
+    if not data: return Klines()
+    out = Klines.from_binance(data)
     set_cache(key, out)
     return out
 
@@ -224,9 +258,10 @@ def avg(values, n): return sum(values[-n:]) / n if len(values) >= n else None
 
 def atr(kl, n):
     if len(kl) < n + 1: return None
+    hs, ls, cs = kl.h, kl.l, kl.c
     trs = []
     for i in range(1, n + 1):
-        h, l, cprev = kl[-i]["h"], kl[-i]["l"], kl[-i - 1]["c"]
+        h, l, cprev = hs[-i], ls[-i], cs[-i - 1]
         trs.append(max(h - l, abs(h - cprev), abs(l - cprev)))
     return sum(trs) / len(trs)
 
@@ -255,7 +290,7 @@ def fear_greed():
 #  ESTADO / RENDIMIENTO
 # ==========================
 def record_trade(sym, result, direction):
-    performance["trades"].append({"sym": sym, "result": result, "dir": direction, "ts": nowiso()})
+    performance["trades"].append(ClosedTrade(sym, result, direction, nowiso()))
     if result == "TP": performance["wins"] += 1
     if result == "SL": performance["losses"] += 1
     performance["trades"] = performance["trades"][-400:]  # guarda últimas 400
@@ -268,7 +303,7 @@ def evaluate_symbol(symbol):
     """Evalúa entradas y gestiona cierres intrabar (H1)."""
     kl = get_klines(symbol, "1h", 200)
     if not kl: return None
-    closes = [x["c"] for x in kl]; vols = [x["v"] for x in kl]; p = closes[-1]
+    closes = kl.c; vols = kl.v; p = closes[-1]
 
     # params por símbolo (si definidos)
     pmap = params.get("PARAMS_BY_SYMBOL", {}).get(symbol, {})
@@ -298,14 +333,14 @@ def evaluate_symbol(symbol):
     # Anti-duplicado señales últimas 24h
     recent = []
     for t in performance.get("trades", []):
-        ts = t.get("ts")
+        ts = t.ts
         try:
             dt = datetime.fromisoformat(ts)
             if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-            if dt > datetime.now(timezone.utc) - timedelta(hours=24):
+            if dt > CLOCK.now(timezone.utc) - timedelta(hours=24):
                 recent.append(t)
         except: pass
-    recent_tags = {(t["sym"], t["dir"]) for t in recent}
+    recent_tags = {(t.sym, t.dir) for t in recent}
 
     # === Entradas ===
     if vol_ok and pull_ok:
@@ -318,15 +353,13 @@ def evaluate_symbol(symbol):
             else:
                 sl = round(entry * (1 - params["SL_PCT"]), 4)
                 tp = round(entry * (1 + params["TP_PCT"]), 4)
-            already_similar = any(tr["open"] and tr["dir"]=="L" and abs(tr["entry"]-entry)/entry<0.01 for tr in st["trades"])
+            already_similar = any(tr.open and tr.dir=="L" and abs(tr.entry-entry)/entry<0.01 for tr in st["trades"])
             if not already_similar:
-                st["trades"].append({"dir":"L","entry":entry,"sl":sl,"tp":tp,"open":True})
+                st["trades"].append(Position("L", entry, sl, tp))
                 safe_save_json(STATE_PATH, state)
-                new_payloads.append({
-                    "evento":"nueva_senal","tipo":"Largo","activo":sym_to_pair(symbol),
-                    "entrada":entry,"sl":sl,"tp":tp,"riesgo":params["RISK_PCT"],"timeframe":"H1",
-                    "timestamp":nowiso(),"comentario":"SMAfast>SMAslow + pullback (ATR) + volumen OK."
-                })
+                new_payloads.append(AlertPayload.signal(
+                    "Largo", sym_to_pair(symbol), entry, sl, tp, params["RISK_PCT"], nowiso(),
+                    "SMAfast>SMAslow + pullback (ATR) + volumen OK."))
 
         # Corto
         if s_fast < s_slow and (symbol, "S") not in recent_tags:
@@ -337,15 +370,13 @@ def evaluate_symbol(symbol):
             else:
                 sl = round(entry * (1 + params["SL_PCT"]), 4)
                 tp = round(entry * (1 - params["TP_PCT"]), 4)
-            already_similar = any(tr["open"] and tr["dir"]=="S" and abs(tr["entry"]-entry)/entry<0.01 for tr in st["trades"])
+            already_similar = any(tr.open and tr.dir=="S" and abs(tr.entry-entry)/entry<0.01 for tr in st["trades"])
             if not already_similar:
-                st["trades"].append({"dir":"S","entry":entry,"sl":sl,"tp":tp,"open":True})
+                st["trades"].append(Position("S", entry, sl, tp))
                 safe_save_json(STATE_PATH, state)
-                new_payloads.append({
-                    "evento":"nueva_senal","tipo":"Corto","activo":sym_to_pair(symbol),
-                    "entrada":entry,"sl":sl,"tp":tp,"riesgo":params["RISK_PCT"],"timeframe":"H1",
-                    "timestamp":nowiso(),"comentario":"SMAfast<SMAslow + pullback (ATR) + volumen OK."
-                })
+                new_payloads.append(AlertPayload.signal(
+                    "Corto", sym_to_pair(symbol), entry, sl, tp, params["RISK_PCT"], nowiso(),
+                    "SMAfast<SMAslow + pullback (ATR) + volumen OK."))
 
     # === Gestión intrabar (precio en vivo) ===
     if st["trades"]:
@@ -353,33 +384,15 @@ def evaluate_symbol(symbol):
         if cur and cur > 0:
             still_open = []
             for tr in st["trades"]:
-                if not tr.get("open"): continue
-                dir_, sl, tp, entry = tr["dir"], float(tr["sl"]), float(tr["tp"]), float(tr["entry"])
-                pair = sym_to_pair(symbol)
-
-                if dir_ == "L":
-                    if cur <= sl:
-                        tr["open"]=False; record_trade(symbol,"SL","L")
-                        new_payloads.append({"evento":"cierre","activo":pair,"resultado":"SL","precio_cierre":cur,
-                                             "timestamp":nowiso(),
-                                             "comentario":f"SL tocado (L). Entrada {entry}, SL {sl}, TP {tp}"})
-                    elif cur >= tp:
-                        tr["open"]=False; record_trade(symbol,"TP","L")
-                        new_payloads.append({"evento":"cierre","activo":pair,"resultado":"TP","precio_cierre":cur,
-                                             "timestamp":nowiso(),
-                                             "comentario":f"TP tocado (L). Entrada {entry}, SL {sl}, TP {tp}"})
-                else:  # Short
-                    if cur >= sl:
-                        tr["open"]=False; record_trade(symbol,"SL","S")
-                        new_payloads.append({"evento":"cierre","activo":pair,"resultado":"SL","precio_cierre":cur,
-                                             "timestamp":nowiso(),
-                                             "comentario":f"SL tocado (S). Entrada {entry}, SL {sl}, TP {tp}"})
-                    elif cur <= tp:
-                        tr["open"]=False; record_trade(symbol,"TP","S")
-                        new_payloads.append({"evento":"cierre","activo":pair,"resultado":"TP","precio_cierre":cur,
-                                             "timestamp":nowiso(),
-                                             "comentario":f"TP tocado (S). Entrada {entry}, SL {sl}, TP {tp}"})
-                if tr.get("open"): still_open.append(tr)
+                if not tr.open: continue
+                result = tr.hit(cur)
+                if result:
+                    tr.open = False; record_trade(symbol, result, tr.dir)
+                    new_payloads.append(AlertPayload.close(
+                        sym_to_pair(symbol), result, cur, nowiso(),
+                        f"{result} tocado ({tr.dir}). Entrada {tr.entry}, SL {tr.sl}, TP {tr.tp}"))
+                else:
+                    still_open.append(tr)
 
             st["trades"] = still_open
             safe_save_json(STATE_PATH, state)
@@ -419,24 +432,24 @@ def report_payload_open_positions():
     today_date = now_local().date()
 
     for t in performance.get("trades", []):
-        ts = datetime.fromisoformat(t["ts"]).date() if "ts" in t else None
+        ts = datetime.fromisoformat(t.ts).date() if t.ts else None
         if ts == today_date:
-            if t.get("result") in ("TP","SL"):
-                today_signals["cerradas"].append(f"{t['sym']} {t['result']}")
+            if t.result in ("TP","SL"):
+                today_signals["cerradas"].append(f"{t.sym} {t.result}")
             else:
-                today_signals["abiertas"].append(t["sym"])
+                today_signals["abiertas"].append(t.sym)
 
     wins_today = sum(1 for t in performance.get("trades", [])
-                     if "ts" in t and datetime.fromisoformat(t["ts"]).date()==today_date and t.get("result")=="TP")
+                     if t.ts and datetime.fromisoformat(t.ts).date()==today_date and t.result=="TP")
     losses_today = sum(1 for t in performance.get("trades", [])
-                       if "ts" in t and datetime.fromisoformat(t["ts"]).date()==today_date and t.get("result")=="SL")
+                       if t.ts and datetime.fromisoformat(t.ts).date()==today_date and t.result=="SL")
     total_today = wins_today + losses_today
     rent_today = ((wins_today - losses_today) / total_today * 100) if total_today else 0
 
     for sym, st in state.items():
         for tr in st["trades"]:
-            if tr.get("open"):
-                open_lines.append(f"{sym_to_pair(sym)} {tr['dir']} @ {tr['entry']} (SL {tr['sl']}, TP {tr['tp']})")
+            if tr.open:
+                open_lines.append(f"{sym_to_pair(sym)} {tr.dir} @ {tr.entry} (SL {tr.sl}, TP {tr.tp})")
     if not open_lines: open_lines = ["Sin operaciones abiertas actualmente."]
 
     comentario = (f"📊 Resumen diario de operaciones\n\n"
@@ -464,7 +477,7 @@ def send_to_make(payload, desc=""):
                 print(f"⚠️ HTTP {r.status_code} enviando a Make: {body} [intento {i}/{max_tries}]")
         except Exception as e:
             print(f"❌ Error enviando a Make ({desc or payload.get('evento','?')}): {e} [intento {i}/{max_tries}]")
-        time.sleep(1.5 * i)
+        CLOCK.sleep(1.5 * i)
     return False
 
 # ==========================
@@ -504,7 +517,7 @@ def backup_all():
         for filename, content in backup_data.items():
             temp_path = f"/tmp/{filename}"
             with open(temp_path, "w", encoding="utf-8") as f:
-                json.dump(content, f, ensure_ascii=False, indent=2)
+                json.dump(content, f, ensure_ascii=False, indent=2, default=json_default)
 
             final_name = f"{filename.replace('.json', '')}_{timestamp}.json"
             file_metadata = {"name": final_name, "parents": [DRIVE_FOLDER_ID]}
@@ -540,8 +553,8 @@ def restore_last_backup():
                 restored += 1
         # recargar a memoria
         global state, performance, params
-        state = safe_load_json(STATE_PATH, state)
-        performance = safe_load_json(PERF_PATH, performance)
+        state = load_state(STATE_PATH, state)
+        performance = load_performance(PERF_PATH, performance)
         params = safe_load_json(PARAMS_PATH, params)
         return restored > 0
     except Exception as e:
@@ -571,8 +584,8 @@ def report_loop():
                     if not st["trades"]: print(f" - {sym}: sin operaciones abiertas")
                     else:
                         for tr in st["trades"]:
-                            status = "abierta" if tr.get("open") else "cerrada"
-                            print(f" - {sym} {tr['dir']} @ {tr['entry']} → {status} (SL {tr['sl']}, TP {tr['tp']})")
+                            status = "abierta" if tr.open else "cerrada"
+                            print(f" - {sym} {tr.dir} @ {tr.entry} → {status} (SL {tr.sl}, TP {tr.tp})")
                 last_state_log = now_loc
 
             # Informes mercado
@@ -590,7 +603,7 @@ def report_loop():
 
         except Exception as e:
             print("report error:", e)
-        time.sleep(15)
+        CLOCK.sleep(15)
 
 def scan_loop():
     print(f"🌀 scan loop: {LOOP_SECONDS}s | 1 símbolo/iteración")
@@ -602,19 +615,20 @@ def scan_loop():
             payloads = evaluate_symbol(sym)
             if payloads:
                 for pld in payloads:
-                    tag = f"{pld['evento']} → {pld.get('tipo', pld.get('resultado',''))} {pld.get('activo','')}"
-                    print(f"📈 {tag}")
-                    send_to_make(pld, desc=tag)
+                    print(f"📈 {pld.tag}")
+                    send_to_make(pld.to_json(), desc=pld.tag)
             print(f"✅ Escaneo {sym} OK. Esperando {LOOP_SECONDS}s...\n")
             idx += 1
         except Exception as e:
             print("scan error:", e)
-        time.sleep(LOOP_SECONDS + uniform(0.5, 1.5))
+        CLOCK.sleep(LOOP_SECONDS + uniform(0.5, 1.5))
 
 # ==========================
 #  FLASK APP / ENDPOINTS
 # ==========================
 app = Flask(__name__)
+_flask_default = app.json.default
+app.json.default = lambda o: json_default(o) if hasattr(o, "to_json") else _flask_default(o)
 
 @app.get("/")
 def health():
@@ -0,0 +1,80 @@
+"""
+Benchmark de memoria: velas como lista de dicts (modelo anterior) frente a
+Klines columnar (models.py), más posiciones/trades/alertas dict vs __slots__.
+
+    python bench_memory.py                  # 1000 símbolos × 1000 velas
+    python bench_memory.py --symbols 200 --bars 500
+"""
+import argparse, gc, time, tracemalloc
+from random import Random
+from models import Klines, Position, ClosedTrade, AlertPayload
+
+def fake_binance(n_bars, rng, t0=1_700_000_000_000):
+    """Filas como las devuelve /api/v3/klines (precios como str, 12 campos)."""
+    rows, p = [], 100.0
+    for i in range(n_bars):
+        o = p; c = o * (1 + rng.gauss(0, 0.01))
+        rows.append([t0 + i * 3_600_000, f"{o:.8f}", f"{max(o, c) * 1.002:.8f}", f"{min(o, c) * 0.998:.8f}",
+                     f"{c:.8f}", f"{rng.uniform(10, 1000):.8f}", t0 + (i + 1) * 3_600_000 - 1,
+                     "0", 0, "0", "0", "0"])
+        p = c
+    return rows
+
+def dict_bars(data):
+    """Construcción original de get_klines."""
+    out = []
+    for k in data:
+        out.append({"t": int(k[0]), "o": float(k[1]), "h": float(k[2]),
+                    "l": float(k[3]), "c": float(k[4]), "v": float(k[5])})
+    return out
+
+def measure(build, inputs):
+    """(bytes retenidos, segundos) construyendo build(x) para cada input."""
+    gc.collect()
+    tracemalloc.start()
+    t = time.perf_counter()
+    kept = [build(x) for x in inputs]
+    dt = time.perf_counter() - t
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size, dt
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--symbols", type=int, default=1000)
+    ap.add_argument("--bars", type=int, default=1000)
+    ap.add_argument("--objects", type=int, default=100_000, help="nº de posiciones/trades/alertas")
+    a = ap.parse_args()
+
+    rng = Random(0)
+    one = fake_binance(a.bars, rng)
+    raw = [one] * a.symbols  # mismo input por símbolo: sólo medimos lo construido
+
+    print(f"Velas: {a.symbols} símbolos × {a.bars} velas")
+    before, t_before = measure(dict_bars, raw)
+    after, t_after = measure(Klines.from_binance, raw)
+    print(f"  list[dict] : {before / 1e6:9.1f} MB  {before / a.symbols / 1024:8.1f} KiB/símbolo  {t_before:6.2f}s")
+    print(f"  Klines     : {after / 1e6:9.1f} MB  {after / a.symbols / 1024:8.1f} KiB/símbolo  {t_after:6.2f}s")
+    print(f"  reducción  : {before / after:.1f}×")
+
+    n = range(a.objects)
+    ts = "2025-10-06T09:00:00+02:00"
+    cases = [
+        ("Position", lambda i: {"dir": "L", "entry": 100.0 + i, "sl": 97.0, "tp": 106.0, "open": True},
+                     lambda i: Position("L", 100.0 + i, 97.0, 106.0)),
+        ("ClosedTrade", lambda i: {"sym": "BTCUSDT", "result": "TP", "dir": "L", "ts": ts},
+                        lambda i: ClosedTrade("BTCUSDT", "TP", "L", ts)),
+        ("AlertPayload", lambda i: {"evento": "nueva_senal", "tipo": "Largo", "activo": "BTC/USD",
+                                    "entrada": 100.0 + i, "sl": 97.0, "tp": 106.0, "riesgo": 1.0, "timeframe": "H1",
+                                    "timestamp": ts, "comentario": "SMAfast>SMAslow + pullback (ATR) + volumen OK."},
+                         lambda i: AlertPayload.signal("Largo", "BTC/USD", 100.0 + i, 97.0, 106.0, 1.0, ts,
+                                                       "SMAfast>SMAslow + pullback (ATR) + volumen OK.")),
+    ]
+    print(f"Objetos ({a.objects}): bytes/objeto dict → slots")
+    for name, as_dict, as_slots in cases:
+        b, _ = measure(as_dict, n); s, _ = measure(as_slots, n)
+        print(f"  {name:<12} {b / a.objects:6.0f} → {s / a.objects:6.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Modelo de datos compacto del agente.
+
+Velas en columnas (array) en lugar de listas de dicts, y posiciones, trades
+cerrados y alertas con __slots__. Cada tipo serializa al MISMO JSON que se
+usaba antes (cache.json, state.json, performance.json y webhooks a Make).
+"""
+from array import array
+
+# ==========================
+#  VELAS
+# ==========================
+class Bar:
+    """Una vela OHLCV (t en ms)."""
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t, self.o, self.h, self.l, self.c, self.v = t, o, h, l, c, v
+
+    def to_json(self):
+        return {"t": self.t, "o": self.o, "h": self.h, "l": self.l, "c": self.c, "v": self.v}
+
+class Klines:
+    """Serie de velas en formato columnar: un array por campo.
+
+    ~48 bytes por vela frente a ~400 de un dict de seis claves con sus floats."""
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, t=None, o=None, h=None, l=None, c=None, v=None):
+        self.t = t if t is not None else array("q")
+        self.o = o if o is not None else array("d")
+        self.h = h if h is not None else array("d")
+        self.l = l if l is not None else array("d")
+        self.c = c if c is not None else array("d")
+        self.v = v if v is not None else array("d")
+
+    @classmethod
+    def from_binance(cls, rows):
+        """Filas crudas de /api/v3/klines ([t, o, h, l, c, v, ...], precios como str)."""
+        if not rows: return cls()
+        cols = list(zip(*rows))
+        return cls(array("q", map(int, cols[0])), *(array("d", map(float, cols[i])) for i in range(1, 6)))
+
+    @classmethod
+    def from_json(cls, rows):
+        """Lista de dicts {"t","o","h","l","c","v"} (formato de cache.json)."""
+        return cls(array("q", (int(r["t"]) for r in rows)),
+                   *(array("d", (float(r[k]) for r in rows)) for k in ("o", "h", "l", "c", "v")))
+
+    def to_json(self):
+        return [{"t": t, "o": o, "h": h, "l": l, "c": c, "v": v}
+                for t, o, h, l, c, v in zip(self.t, self.o, self.h, self.l, self.c, self.v)]
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Klines(self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i])
+        return Bar(self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i])
+
+    def __iter__(self):
+        return map(Bar, self.t, self.o, self.h, self.l, self.c, self.v)
+
+# ==========================
+#  POSICIONES / TRADES
+# ==========================
+class Position:
+    """Operación abierta en state[sym]["trades"]. dir: "L" (largo) o "S" (corto)."""
+    __slots__ = ("dir", "entry", "sl", "tp", "open")
+
+    def __init__(self, dir, entry, sl, tp, open=True):
+        self.dir, self.entry, self.sl, self.tp, self.open = dir, entry, sl, tp, open
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d["dir"], float(d["entry"]), float(d["sl"]), float(d["tp"]), d.get("open", False))
+
+    def to_json(self):
+        return {"dir": self.dir, "entry": self.entry, "sl": self.sl, "tp": self.tp, "open": self.open}
+
+    def hit(self, price):
+        """Devuelve "SL"/"TP" si el precio toca un nivel, None si sigue viva."""
+        if self.dir == "L":
+            if price <= self.sl: return "SL"
+            if price >= self.tp: return "TP"
+        else:
+            if price >= self.sl: return "SL"
+            if price <= self.tp: return "TP"
+        return None
+
+class ClosedTrade:
+    """Trade cerrado en performance["trades"]."""
+    __slots__ = ("sym", "result", "dir", "ts")
+
+    def __init__(self, sym, result, dir, ts):
+        self.sym, self.result, self.dir, self.ts = sym, result, dir, ts
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d.get("sym"), d.get("result"), d.get("dir"), d.get("ts"))
+
+    def to_json(self):
+        return {"sym": self.sym, "result": self.result, "dir": self.dir, "ts": self.ts}
+
+# ==========================
+#  ALERTAS (webhook Make)
+# ==========================
+class AlertPayload:
+    """Alerta de señal o cierre. to_json() emite sólo los campos del evento,
+    en el mismo orden que el payload original."""
+    __slots__ = ("evento", "tipo", "activo", "entrada", "sl", "tp", "riesgo", "timeframe",
+                 "resultado", "precio_cierre", "timestamp", "comentario")
+    _SIGNAL_KEYS = ("evento", "tipo", "activo", "entrada", "sl", "tp", "riesgo", "timeframe", "timestamp", "comentario")
+    _CLOSE_KEYS = ("evento", "activo", "resultado", "precio_cierre", "timestamp", "comentario")
+
+    def __init__(self, evento, activo, timestamp, comentario, tipo=None, entrada=None, sl=None, tp=None,
+                 riesgo=None, timeframe=None, resultado=None, precio_cierre=None):
+        self.evento, self.activo, self.timestamp, self.comentario = evento, activo, timestamp, comentario
+        self.tipo, self.entrada, self.sl, self.tp = tipo, entrada, sl, tp
+        self.riesgo, self.timeframe = riesgo, timeframe
+        self.resultado, self.precio_cierre = resultado, precio_cierre
+
+    @classmethod
+    def signal(cls, tipo, activo, entrada, sl, tp, riesgo, timestamp, comentario, timeframe="H1"):
+        return cls("nueva_senal", activo, timestamp, comentario, tipo=tipo, entrada=entrada,
+                   sl=sl, tp=tp, riesgo=riesgo, timeframe=timeframe)
+
+    @classmethod
+    def close(cls, activo, resultado, precio_cierre, timestamp, comentario):
+        return cls("cierre", activo, timestamp, comentario, resultado=resultado, precio_cierre=precio_cierre)
+
+    def to_json(self):
+        keys = self._SIGNAL_KEYS if self.evento == "nueva_senal" else self._CLOSE_KEYS
+        return {k: getattr(self, k) for k in keys}
+
+    @property
+    def tag(self):
+        return f"{self.evento} → {self.tipo or self.resultado or ''} {self.activo}"
+
+def json_default(obj):
+    """Hook `default=` para json.dump / Flask: serializa los tipos de este módulo."""
+    if isinstance(obj, (Bar, Klines, Position, ClosedTrade, AlertPayload)):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,332 @@
+"""
+Simulación acelerada del agente con reloj virtual.
+
+Ejecuta scan_loop y report_loop de app.py SIN modificarlos, contra velas
+grabadas de Binance, con un reloj virtual que avanza en cuanto ambos hilos
+duermen. Los webhooks a Make se capturan en un JSONL local en lugar de enviarse.
+
+    # 1) grabar histórico H1 (requiere red)
+    python simulate.py record --symbols BTCUSDT,ETHUSDT --days 30 --out market.json
+
+    # 2) simular (sin red)
+    python simulate.py run --data market.json --days 14 --out webhooks.jsonl
+"""
+import os, sys, json, time, tempfile, threading, argparse, contextlib, random, importlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+# ==========================
+#  RELOJ VIRTUAL
+# ==========================
+class SimulationFinished(BaseException):
+    """Fin del tiempo simulado. Hereda de BaseException para atravesar los
+    `except Exception` de los loops del agente."""
+
+class VirtualClock:
+    """Reloj de eventos discretos para N hilos ("actores").
+
+    Cada actor que llama a sleep() queda registrado con su hora de despertar;
+    cuando TODOS los actores duermen, el reloj salta a la más próxima. Así los
+    loops se intercalan en el mismo orden que en tiempo real, sin esperar."""
+    def __init__(self, start, end, actors):
+        self._now = start.astimezone(timezone.utc)
+        self._end = end.astimezone(timezone.utc)
+        self._actors = actors
+        self._sleepers = {}
+        self._cv = threading.Condition()
+        self.finished = False
+
+    def now(self, tz=None):
+        t = self._now
+        return t.astimezone(tz) if tz else t.astimezone().replace(tzinfo=None)
+
+    def sleep(self, seconds):
+        me = threading.get_ident()
+        with self._cv:
+            if self.finished: raise SimulationFinished()
+            wake = self._now + timedelta(seconds=max(seconds, 0))
+            self._sleepers[me] = wake
+            self._advance_if_idle()
+            while self._now < wake and not self.finished:
+                self._cv.wait()
+            del self._sleepers[me]
+            if self.finished: raise SimulationFinished()
+
+    def retire(self):
+        """Un actor termina (p. ej. por excepción): deja de contar para avanzar."""
+        with self._cv:
+            self._actors -= 1
+            self._advance_if_idle()
+
+    def _advance_if_idle(self):
+        if len(self._sleepers) < self._actors: return
+        nxt = min(self._sleepers.values(), default=self._end)
+        if nxt > self._end or self._actors <= 0:
+            self.finished = True
+        else:
+            self._now = max(self._now, nxt)
+        self._cv.notify_all()
+
+# ==========================
+#  MERCADO GRABADO (Binance falso)
+# ==========================
+class RecordedMarket:
+    """Sirve /api/v3/klines, /ticker/price y /ticker/24hr desde velas grabadas.
+
+    Sin mirar al futuro: /klines devuelve las velas CERRADAS a la hora virtual
+    y, como Binance, una última vela en formación. Ésta se aproxima con
+    o=h=l=c=apertura y el volumen grabado prorrateado por el tiempo transcurrido
+    (el total de la vela es el único dato "futuro" que se usa). El precio en
+    vivo es la apertura de la vela en curso."""
+    def __init__(self, data, clock):
+        self.interval = data["interval"]
+        self.step = INTERVAL_MS[self.interval]
+        self.klines = {s: sorted(k, key=lambda r: r[0]) for s, k in data["klines"].items()}
+        self.clock = clock
+
+    def _now_ms(self):
+        return int(self.clock.now(timezone.utc).timestamp() * 1000)
+
+    def _closed(self, symbol):
+        """Índice (exclusivo) de la primera vela aún no cerrada."""
+        rows = self.klines.get(symbol, [])
+        cutoff = self._now_ms() - self.step
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if rows[mid][0] <= cutoff: lo = mid + 1
+            else: hi = mid
+        return rows, lo
+
+    def last_price(self, symbol):
+        rows, n = self._closed(symbol)
+        if n < len(rows): return float(rows[n][1])
+        return float(rows[n - 1][4]) if n else None
+
+    def handle(self, path, params):
+        symbol = (params or {}).get("symbol")
+        if symbol not in self.klines: return 400, {"code": -1121, "msg": "Invalid symbol."}
+        if path.endswith("/klines"):
+            if params.get("interval", self.interval) != self.interval: return 200, []
+            rows, n = self._closed(symbol)
+            limit = int(params.get("limit", 500))
+            out = [list(r) for r in rows[max(0, n - limit + 1):n]]
+            if n < len(rows):
+                t, o, v = rows[n][0], rows[n][1], float(rows[n][5])
+                frac = min(max((self._now_ms() - t) / self.step, 0.0), 1.0)
+                out.append([t, o, o, o, o, str(v * frac)])
+            return 200, out[-limit:]
+        p = self.last_price(symbol)
+        if p is None: return 400, {"code": -1100, "msg": "Sin datos."}
+        if path.endswith("/ticker/price"):
+            return 200, {"symbol": symbol, "price": str(p)}
+        if path.endswith("/ticker/24hr"):
+            rows, n = self._closed(symbol)
+            day = rows[max(0, n - 86_400_000 // self.step):n] or [[0, p, p, p, p, 0]]
+            open_ = float(day[0][1])
+            return 200, {"symbol": symbol, "lastPrice": str(p),
+                         "lowPrice": str(min(float(r[3]) for r in day)),
+                         "highPrice": str(max(float(r[2]) for r in day)),
+                         "priceChangePercent": str((p - open_) / open_ * 100 if open_ else 0)}
+        return 404, {"code": -1, "msg": "Endpoint no simulado."}
+
+# ==========================
+#  RED SIMULADA (sustituye a `requests` dentro de app)
+# ==========================
+class SimResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body) if body is not None else ""
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}: {self.text[:160]}")
+
+class SimHTTP:
+    """Binance → RecordedMarket; POST (webhooks) → captura local; resto → sin red."""
+    def __init__(self, market, clock, sink):
+        self.market = market
+        self.clock = clock
+        self.sink = sink
+        self.webhooks = []
+        self.calls = Counter()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if "/api/v3/" in url:
+            path = url.split("/api/v3", 1)[1]
+            self.calls[path] += 1
+            return SimResponse(*self.market.handle(path, params or {}))
+        self.calls["offline"] += 1
+        raise ConnectionError(f"simulación sin red: {url}")
+
+    def post(self, url, json=None, timeout=None, **kw):
+        rec = {"sim_time": self.clock.now(timezone.utc).isoformat(timespec="seconds"), "url": url, "payload": json}
+        self.webhooks.append(rec)
+        if self.sink:
+            self.sink.write(_json_dumps(rec) + "\n")
+        return SimResponse(200, {"accepted": True})
+
+class OfflineFeeds:
+    """Sustituye a feedparser: sin titulares en simulación."""
+    class _Feed:
+        entries = []
+
+    def parse(self, url):
+        return self._Feed()
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False)
+
+# ==========================
+#  GRABACIÓN DE VELAS
+# ==========================
+def record_market(symbols, days, interval, out_path):
+    """Descarga velas históricas de Binance (paginado de 1000) a un JSON."""
+    import app
+    step = INTERVAL_MS[interval]
+    end_ms = int(time.time() * 1000) // step * step
+    start_ms = end_ms - days * 86_400_000
+    data = {"interval": interval, "klines": {}}
+    for sym in symbols:
+        rows, cur = [], start_ms
+        while cur < end_ms:
+            chunk = app.http_get(f"{app.BINANCE}/api/v3/klines",
+                                 {"symbol": sym, "interval": interval, "startTime": cur, "endTime": end_ms - 1, "limit": 1000})
+            if not chunk: break
+            rows.extend([int(k[0]), k[1], k[2], k[3], k[4], k[5]] for k in chunk)
+            cur = int(chunk[-1][0]) + step
+        data["klines"][sym] = rows
+        print(f"📥 {sym}: {len(rows)} velas {interval}")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    print(f"💾 Guardado → {out_path}")
+
+# ==========================
+#  SIMULACIÓN
+# ==========================
+def _parse_dt(s):
+    dt = datetime.fromisoformat(s)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def run_simulation(data_path, start=None, days=None, out_path="webhooks.jsonl",
+                   warmup_bars=200, seed=0, quiet=True, profile_path=None):
+    """Ejecuta los loops del agente contra `data_path` en tiempo virtual y
+    devuelve un resumen (duración virtual/real, aceleración, eventos)."""
+    with open(data_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    step = INTERVAL_MS[data["interval"]]
+    firsts = [k[0][0] for k in data["klines"].values() if k]
+    lasts = [k[-1][0] for k in data["klines"].values() if k]
+    if not firsts: raise SystemExit("Sin velas en el fichero de datos.")
+    t0 = _parse_dt(start) if start else datetime.fromtimestamp((max(firsts) + warmup_bars * step) / 1000, timezone.utc)
+    t_end = datetime.fromtimestamp((min(lasts) + step) / 1000, timezone.utc)
+    if days: t_end = min(t_end, t0 + timedelta(days=days))
+    if t_end <= t0: raise SystemExit("Rango de simulación vacío (pocas velas para el warm-up).")
+
+    # app.py lee entorno y crea ficheros al importarse: directorio aislado por
+    # ejecución y (re)carga del módulo para no heredar estado de otra simulación.
+    data_dir = tempfile.mkdtemp(prefix="cripto_sim_")
+    saved_env = {k: os.environ.get(k) for k in ("BOT_DATA_DIR", "SYMBOLS")}
+    os.environ["BOT_DATA_DIR"] = data_dir
+    os.environ["SYMBOLS"] = ",".join(data["klines"].keys())
+    log = open(os.devnull, "w", encoding="utf-8") if quiet else sys.stdout
+    sink = saved_app = None
+    try:
+        with contextlib.redirect_stdout(log):
+            if "app" in sys.modules:
+                app = importlib.reload(sys.modules["app"])
+            else:
+                import app
+        saved_app = (app.requests, app.feedparser, app.CLOCK)
+
+        random.seed(seed)
+        clock = VirtualClock(t0, t_end, actors=2)
+        app.set_clock(clock)
+        sink = open(out_path, "w", encoding="utf-8") if out_path else None
+        net = SimHTTP(RecordedMarket(data, clock), clock, sink)
+        app.requests = net
+        app.feedparser = OfflineFeeds()
+
+        profiles, errors = [], []
+        def actor(loop):
+            prof = None
+            if profile_path:
+                import cProfile
+                prof = cProfile.Profile(); profiles.append(prof); prof.enable()
+            try:
+                loop()
+            except SimulationFinished:
+                pass
+            except BaseException as e:
+                errors.append(f"{loop.__name__}: {e!r}")
+            finally:
+                if prof: prof.disable()
+                clock.retire()
+
+        wall0 = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            threads = [threading.Thread(target=actor, args=(fn,), daemon=True) for fn in (app.scan_loop, app.report_loop)]
+            for th in threads: th.start()
+            for th in threads: th.join()
+        wall = time.perf_counter() - wall0
+    finally:
+        if saved_app: app.requests, app.feedparser, app.CLOCK = saved_app
+        if sink: sink.close()
+        if log is not sys.stdout: log.close()
+        for k, v in saved_env.items():
+            if v is None: os.environ.pop(k, None)
+            else: os.environ[k] = v
+
+    if profile_path and profiles:
+        import pstats
+        stats = pstats.Stats(profiles[0])
+        for p in profiles[1:]: stats.add(p)
+        stats.dump_stats(profile_path)
+
+    virtual = (t_end - t0).total_seconds()
+    kinds = Counter(f"{w['payload'].get('evento')}:{w['payload'].get('tipo', w['payload'].get('resultado', ''))}"
+                    for w in net.webhooks)
+    return {"desde": t0.isoformat(), "hasta": t_end.isoformat(), "data_dir": data_dir,
+            "segundos_virtuales": virtual, "segundos_reales": round(wall, 3),
+            "aceleracion": round(virtual / wall) if wall else None,
+            "escaneos": net.calls["/klines"], "webhooks": dict(kinds),
+            "trades_cerrados": len(app.performance.get("trades", [])),
+            "wins": app.performance.get("wins", 0), "losses": app.performance.get("losses", 0),
+            "errores": errors}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Simulación acelerada del Agente Cripto AI.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="Graba velas de Binance a un JSON.")
+    rec.add_argument("--symbols", default=os.environ.get("SYMBOLS", "BTCUSDT,ETHUSDT,SOLUSDT,AVAXUSDT,BNBUSDT"))
+    rec.add_argument("--days", type=int, default=30)
+    rec.add_argument("--interval", default="1h", choices=sorted(INTERVAL_MS))
+    rec.add_argument("--out", default="market.json")
+
+    run = sub.add_parser("run", help="Ejecuta los loops del agente en tiempo virtual.")
+    run.add_argument("--data", required=True)
+    run.add_argument("--start", help="Inicio ISO-8601 (UTC si no lleva zona). Por defecto: tras el warm-up.")
+    run.add_argument("--days", type=float)
+    run.add_argument("--out", default="webhooks.jsonl", help="JSONL con los webhooks capturados.")
+    run.add_argument("--warmup-bars", type=int, default=200)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--verbose", action="store_true", help="Muestra los logs del agente.")
+    run.add_argument("--profile", help="Vuelca estadísticas cProfile (ambos loops) a este fichero.")
+
+    a = ap.parse_args(argv)
+    if a.cmd == "record":
+        record_market([s.strip() for s in a.symbols.split(",") if s.strip()], a.days, a.interval, a.out)
+    else:
+        summary = run_simulation(a.data, a.start, a.days, a.out, a.warmup_bars, a.seed,
+                                 quiet=not a.verbose, profile_path=a.profile)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()